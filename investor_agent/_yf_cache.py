@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import yfinance as yf
+from curl_cffi import requests as curl_requests
+
+try:
+    import diskcache
+except ImportError:  # optional: only needed to share the cache across workers
+    diskcache = None
+
+
+# One keep-alive HTTP session (connection pool + TLS reuse) for every yfinance
+# call. yfinance needs a curl_cffi session for browser impersonation, so this is
+# not a plain requests.Session; transient failures are retried with backoff.
+SESSION = curl_requests.Session(
+    impersonate="chrome",
+    retry=curl_requests.RetryStrategy(count=3, delay=0.2, backoff="exponential"),
+)
+
+# Seconds a downloaded price history is served from the cache (default 15 minutes)
+HISTORY_TTL = float(os.environ.get("YF_CACHE_TTL", 15 * 60))
+
+# Most entries each in-process cache keeps; the least recently used go first
+TICKER_CACHE_SIZE = 4096
+HISTORY_CACHE_SIZE = int(os.environ.get("YF_CACHE_SIZE", 1024))
+
+# symbol -> (created_at, yf.Ticker), least recently used first
+ticker_cache = OrderedDict()
+_ticker_lock = threading.Lock()
+
+# (symbol, period, interval) or (symbol, start, end, interval) -> (fetched_at, DataFrame),
+# least recently used first
+history_cache = OrderedDict()
+_history_lock = threading.Lock()
+
+# When diskcache is installed, histories are also stored on disk so that every
+# uvicorn worker process shares the same downloads.
+_disk_cache = (
+    diskcache.Cache(os.environ.get("YF_CACHE_DIR", ".cache/yfinance"))
+    if diskcache is not None
+    else None
+)
+
+
+def _lookup(cache, key):
+    """Return cache[key] (or None) and mark it as recently used. Hold the cache's lock."""
+    entry = cache.get(key)
+    if entry is not None:
+        cache.move_to_end(key)
+    return entry
+
+
+def _store(cache, key, entry, max_size):
+    """
+    Insert entry, first dropping expired entries and then the least recently
+    used ones until the cache fits in max_size. Hold the cache's lock.
+    """
+    cache[key] = entry
+    cache.move_to_end(key)
+    now = time.time()
+    for stale in [k for k, (stamp, _) in cache.items() if now - stamp >= HISTORY_TTL]:
+        del cache[stale]
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+
+def get_ticker(symbol):
+    """
+    Return a yf.Ticker on the shared session, reusing it for up to HISTORY_TTL
+    seconds. Tickers memoize their fundamentals (including an empty frame after a
+    failed fetch) forever, so they are rebuilt once stale.
+    """
+    now = time.time()
+    with _ticker_lock:
+        entry = _lookup(ticker_cache, symbol)
+        if entry is None or now - entry[0] >= HISTORY_TTL:
+            entry = (now, yf.Ticker(symbol, session=SESSION))
+            _store(ticker_cache, symbol, entry, TICKER_CACHE_SIZE)
+    return entry[1]
+
+
+def get_history(symbol, period=None, interval="1d", start=None, end=None):
+    """
+    Return the price history of a ticker, reusing a recent download when possible.
+
+    Parameters:
+    symbol (str): Stock ticker symbol.
+    period (str): Data period (e.g. '6mo', '2y'); ignored when start or end is given.
+    interval (str): Bar interval (default is '1d').
+    start (str, optional): Start date (format: YYYY-MM-DD).
+    end (str, optional): End date (format: YYYY-MM-DD).
+
+    Returns:
+    pd.DataFrame: A copy of the cached history, safe for the caller to modify.
+    """
+    if start is not None or end is not None:
+        key = (symbol, start, end, interval)
+        kwargs = {"start": start, "end": end, "interval": interval}
+    else:
+        key = (symbol, period, interval)
+        kwargs = {"period": period, "interval": interval}
+    now = time.time()
+    with _history_lock:
+        entry = _lookup(history_cache, key)
+    if entry is None and _disk_cache is not None:
+        entry = _disk_cache.get(key)
+    if entry is not None and now - entry[0] < HISTORY_TTL:
+        return entry[1].copy()
+
+    df = get_ticker(symbol).history(**kwargs)
+    # Empty frames usually mean a bad symbol or a failed request; don't keep them
+    if not df.empty:
+        entry = (now, df)
+        with _history_lock:
+            _store(history_cache, key, entry, HISTORY_CACHE_SIZE)
+        if _disk_cache is not None:
+            _disk_cache.set(key, entry, expire=HISTORY_TTL)
+    return df.copy()
+
+
+def clear_cache():
+    with _ticker_lock:
+        ticker_cache.clear()
+    with _history_lock:
+        history_cache.clear()
+    if _disk_cache is not None:
+        _disk_cache.clear()
@@ -1,18 +1,33 @@
+import logging
 import pandas as pd
 import numpy as np
-import yfinance as yf
+from investor_agent._yf_cache import get_history, get_ticker
+from investor_agent.kernels import ma_multi, max_high_min_low
 
+logger = logging.getLogger(__name__)
 
-def calculate_moving_averages(df, windows=[10, 20, 50, 100, 200, 150]):
-    for window in windows:
-        df[f"MA{window}"] = df["Close"].rolling(window=window).mean()
-    return df
+# Moving averages checked for an upward trend, and how many bars back each is compared
+TREND_WINDOWS = [10, 20, 50, 100, 200]
+TREND_LOOKBACKS = np.array([5, 10, 25, 50, 100])
+# The trend MAs come first so their columns are mas[:, : len(TREND_WINDOWS)]
+MA_WINDOWS = TREND_WINDOWS + [150]
 
 
-def is_trending_up(series, days_ago):
-    if len(series) <= days_ago:
-        return True  # not enough data to compare, assume True
-    return series.iloc[-1] >= series.iloc[-(days_ago + 1)]
+def calculate_moving_averages(df, windows=MA_WINDOWS, join=False):
+    """
+    Compute the moving averages of df["Close"] for each window.
+
+    Returns:
+    tuple: (df, mas) where mas[:, k] is the MA for windows[k]. The MA{window}
+    columns are only added to df (in a single join) when join is True.
+    """
+    close = df["Close"].to_numpy(np.float64, copy=False)
+    mas = np.empty((len(close), len(windows)))
+    ma_multi(close, np.asarray(windows, dtype=np.int64), mas)
+    if join:
+        columns = [f"MA{window}" for window in windows]
+        df = df.join(pd.DataFrame(mas, index=df.index, columns=columns))
+    return df, mas
 
 
 def check_ma_sequence(latest):
@@ -24,14 +39,13 @@ def check_ma_sequence(latest):
     return False
 
 
-def check_mas_trending_up(df):
-    return (
-        is_trending_up(df["MA10"], 5)
-        and is_trending_up(df["MA20"], 10)
-        and is_trending_up(df["MA50"], 25)
-        and is_trending_up(df["MA100"], 50)
-        and is_trending_up(df["MA200"], 100)
-    )
+def check_mas_trending_up(mas):
+    # mas holds the TREND_WINDOWS moving averages as columns
+    n = len(mas)
+    prev = mas[np.maximum(n - 1 - TREND_LOOKBACKS, 0), np.arange(len(TREND_WINDOWS))]
+    # not enough data to compare, assume True
+    trending = (mas[-1] >= prev) | (TREND_LOOKBACKS >= n)
+    return bool(trending.all())
 
 
 def check_price_conditions(latest):
@@ -44,56 +58,41 @@ def check_price_conditions(latest):
 
 
 def check_higher_highs_lows(df):
-    if len(df) < 120:
+    high = df["High"].to_numpy(np.float64)
+    low = df["Low"].to_numpy(np.float64)
+    n = len(high)
+    if n <= 120:
         return False
-    recent_period = df.iloc[-120:]
-    prior_period = df.iloc[-240:-120] if len(df) >= 240 else df.iloc[:-120]
-    if recent_period.empty or prior_period.empty:
+    # Last 120 bars against the (up to) 120 bars before them
+    split, mid = max(0, n - 240), n - 120
+    recent_high, recent_low = max_high_min_low(high[mid:], low[mid:])
+    prior_high, prior_low = max_high_min_low(high[split:mid], low[split:mid])
+    return bool(recent_high > prior_high and recent_low > prior_low)
+
+
+def check_growth(statement, row):
+    # At least 2 of the last 3 period-over-period changes must be growth
+    if statement is None or row not in statement.index:
         return False
-    return (
-        recent_period["High"].max() > prior_period["High"].max()
-        and recent_period["Low"].min() > prior_period["Low"].min()
-    )
+    values = statement.loc[row].dropna().to_numpy(np.float64)[:4]
+    if len(values) < 4:
+        return False
+    current, prior = values[:-1], values[1:]
+    # (current - prior) / |prior| > 0 exactly when current > prior; a zero prior counts as 0
+    return int(((current > prior) & (prior != 0)).sum()) >= 2
 
 
 def check_fundamentals(stock):
     # Placeholder: this function can be expanded to fetch and compute fundamental data.
     try:
+        # yfinance's Ticker.financials is the income statement again, so read
+        # both rows from one fetch
         income_stmt = stock.income_stmt
-        if income_stmt is not None and "Net Income" in income_stmt.index:
-            net_income_values = income_stmt.loc["Net Income"].dropna().iloc[:4]
-        else:
-            net_income_values = pd.Series(dtype=float)
-        eps_growth = []
-        if len(net_income_values) == 4:
-            eps_growth = [
-                (net_income_values.iloc[i] - net_income_values.iloc[i + 1])
-                / abs(net_income_values.iloc[i + 1])
-                if net_income_values.iloc[i + 1] != 0
-                else 0
-                for i in range(3)
-            ]
-        eps_growth_pass = sum(1 for g in eps_growth if g > 0) >= 2
-
-        financials = stock.financials
-        if financials is not None and "Total Revenue" in financials.index:
-            revenue_values = financials.loc["Total Revenue"].dropna().iloc[:4]
-        else:
-            revenue_values = pd.Series(dtype=float)
-        sales_growth = []
-        if len(revenue_values) == 4:
-            sales_growth = [
-                (revenue_values.iloc[i] - revenue_values.iloc[i + 1])
-                / abs(revenue_values.iloc[i + 1])
-                if revenue_values.iloc[i + 1] != 0
-                else 0
-                for i in range(3)
-            ]
-        sales_growth_pass = sum(1 for g in sales_growth if g > 0) >= 2
-
+        eps_growth_pass = check_growth(income_stmt, "Net Income")
+        sales_growth_pass = check_growth(income_stmt, "Total Revenue")
         return eps_growth_pass and sales_growth_pass
     except Exception as e:
-        print(f"Error fetching EPS/Sales data: {e}")
+        logger.error("Error fetching EPS/Sales data: %s", e)
         return False
 
 
@@ -107,21 +106,23 @@ def check_relative_strength(df, price):
     return False
 
 
-def analyze_stock_stage2(ticker):
-    stock = yf.Ticker(ticker)
-    df = stock.history(period="2y")
+def analyze_stock_stage2(ticker, df=None):
+    stock = get_ticker(ticker)
+    if df is None:
+        df = get_history(ticker, period="2y")
     if df.empty or "Close" not in df.columns:
         raise Exception(
             f"No data retrieved for {ticker}. Please check the ticker symbol."
         )
 
-    # Calculate all moving averages
-    df = calculate_moving_averages(df)
-    latest = df.iloc[-1]
+    # Calculate all moving averages; the checks read the array, not MA columns
+    df, mas = calculate_moving_averages(df)
+    latest = dict(zip([f"MA{window}" for window in MA_WINDOWS], mas[-1].tolist()))
+    latest["Close"] = df["Close"].iloc[-1]
 
     # Evaluate criteria
     ma_sequence = check_ma_sequence(latest)
-    mas_trending_up = check_mas_trending_up(df)
+    mas_trending_up = check_mas_trending_up(mas[:, : len(TREND_WINDOWS)])
     price_condition = check_price_conditions(latest)
     higher_highs_lows = check_higher_highs_lows(df)
     eps_sales_growth = check_fundamentals(stock)
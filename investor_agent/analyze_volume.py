@@ -1,113 +1,120 @@
+import asyncio
+import httpx
+import logging
 import pandas as pd
-import yfinance as yf
 import numpy as np
 import re
-import time
+import yfinance as yf
 import investor_agent.stock_data as sd
+from investor_agent._yf_cache import SESSION, get_history
+from investor_agent.kernels import analyze_volume_kernel, ma_multi
 
+logger = logging.getLogger(__name__)
 
-def volume_analysis(ticker, period="6mo"):
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{ticker}"
+# Yahoo rejects requests without a browser-like User-Agent
+YAHOO_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+    )
+}
+
+
+PERIOD_RE = re.compile(r"(\d+)(wk|mo|y)")
+WEEKS_PER_UNIT = {"wk": 1, "mo": 4, "y": 52}  # Assume 1 month ≈ 4 weeks
+# (longest period in weeks, (SMA window, recent weeks for trend confirmation))
+PERIOD_BUCKETS = [
+    (26, (10, 4)),  # 6 months or less: short-term trend
+    (52, (20, 6)),  # 6 months to 1 year: medium-term trend
+    (104, (50, 8)),  # 1 to 2 years: long-term trend
+]
+
+# Institutional activity by sentiment score: < -0.3, [-0.3, -0.1), [-0.1, 0.1],
+# (0.1, 0.3] and > 0.3. The upper bins are nudged up so 0.1 and 0.3 stay in
+# the lower band, matching the strict ">" comparisons.
+SENTIMENT_BINS = np.array([-0.3, -0.1, np.nextafter(0.1, 1), np.nextafter(0.3, 1)])
+INSTITUTION_ACTIVITY = [
+    "high distribution, indicating possible downtrend.",
+    "potential distribution, suggesting institutional selling pressure.",
+    "mixed activity, with no clear sign of accumulation or distribution.",
+    "moderate accumulation with potential bullish trend.",
+    "strong institutional accumulation and bullish momentum.",
+]
+
+
+def volume_analysis(ticker, period="6mo", include_data=False, df=None):
     """
     Fetch stock data from Yahoo Finance and analyze for smart money accumulation.
 
     Parameters:
     ticker (str): Stock ticker symbol.
     period (str): Data period for analysis (default is '6mo' for 6 months).
+    include_data (bool): Also return the weekly rows behind the insights.
+    df (pd.DataFrame, optional): Weekly bars to analyze; downloaded when not given.
 
     Returns:
     dict: Dictionary containing the analyzed DataFrame and key insights.
     """
-    stock = yf.Ticker(ticker)
-    df = stock.history(period=period, interval="1wk")
+    if df is None:
+        df = get_history(ticker, period=period, interval="1wk")
 
     if df.empty:
         return {
             "error": f"No data found for {ticker}. Ensure the ticker is correct and try again."
         }
 
-    df.reset_index(inplace=True)
-    df.rename(
-        columns={"Date": "Date", "Close": "Close", "Volume": "Volume"}, inplace=True
-    )
+    df = df.reset_index()  # don't modify the caller's frame
+
+    close = df["Close"].to_numpy(np.float64)
+    volume = df["Volume"].to_numpy(np.float64)
 
     # Moving average volume, filling NaN with 0
-    df["10_Week_MA_Volume"] = df["Volume"].rolling(window=10).mean().fillna(0)
-
-    df["Above_Avg_Volume"] = df["Volume"] > df["10_Week_MA_Volume"]
-    df["Price_Increase"] = df["Close"].diff().fillna(0) > 0  # Avoid NaN in first row
-    df["Strong_Price_Increase"] = (
-        df["Close"].pct_change().fillna(0) > 0.005
-    )  # At least 0.5% increase
-    df["Above_Avg_Volume"] = df["Volume"] > (
-        df["10_Week_MA_Volume"] * 1.2
-    )  # Volume 20% above average
-    df["Closing_Strong"] = (df["Close"] - df["Low"]) / (
-        df["High"] - df["Low"]
-    ) > 0.5  # Closes in top 50% of range
-
-    df["Accumulation_Day"] = (
-        df["Above_Avg_Volume"] & df["Strong_Price_Increase"] & df["Closing_Strong"]
-    )
-    df["Mild_Pullback"] = (
-        df["Close"].pct_change().fillna(0) > -0.05
-    )  # Decline is less than 5%
-    df["Volatility_Check"] = (df["High"] - df["Low"]) / df[
-        "Low"
-    ] < 0.08  # Weekly volatility under 8%
-    df["Previous_Uptrend"] = df["Close"].shift(1) > df["Close"].shift(
-        2
-    )  # Prior week was an uptrend
-
-    df["Low_Volume_Pullback"] = (
-        (~df["Above_Avg_Volume"])
-        & (df["Close"].diff().fillna(0) < 0)
-        & df["Mild_Pullback"]
-        & df["Volatility_Check"]
-        & df["Previous_Uptrend"]
+    ma10_vol = np.empty((len(volume), 1))
+    ma_multi(volume, np.array([10], dtype=np.int64), ma10_vol)
+    ma10_vol = ma10_vol[:, 0]
+    ma10_vol[np.isnan(ma10_vol)] = 0.0
+
+    # Accumulation days and low-volume pullbacks, flagged in one pass
+    accumulation_day = np.empty(len(df), dtype=bool)
+    low_volume_pullback = np.empty(len(df), dtype=bool)
+    accumulation_count, pullback_count, weighted_accumulation = analyze_volume_kernel(
+        close,
+        df["High"].to_numpy(np.float64),
+        df["Low"].to_numpy(np.float64),
+        volume,
+        ma10_vol,
+        accumulation_day,
+        low_volume_pullback,
     )
 
     # Insight generation
-    accumulation_count = int(df["Accumulation_Day"].sum())  # Convert to Python int
-    pullback_count = int(df["Low_Volume_Pullback"].sum())  # Convert to Python int
+    accumulation_count = int(accumulation_count)  # Convert to Python int
+    pullback_count = int(pullback_count)  # Convert to Python int
     # Convert period string into an integer number of weeks
-
-    match = re.match(r"(\d+)(wk|mo|y)", period)
-    if match:
-        period_value, period_unit = int(match.group(1)), match.group(2)
-
-        # Convert months and years to weeks if necessary
-        if period_unit == "mo":
-            period_value *= 4  # Assume 1 month ≈ 4 weeks
-        elif period_unit == "y":
-            period_value *= 52  # Assume 1 year = 52 weeks
-
-    else:
-        period_value = 26  # Default to 6 months (26 weeks) if format is unclear
+    # (default to 6 months / 26 weeks if format is unclear)
+    match = PERIOD_RE.match(period)
+    period_weeks = int(match[1]) * WEEKS_PER_UNIT[match[2]] if match else 26
 
     # Select moving average and trend confirmation window based on the period
-    if period_value <= 26:  # 6 months or less
-        ma_window = 10  # Short-term trend (10-week SMA)
-        recent_weeks = 4  # Use last 4 weeks for trend confirmation
-    elif 27 <= period_value <= 52:  # 6 months to 1 year
-        ma_window = 20  # Medium-term trend (20-week SMA)
-        recent_weeks = 6  # Use last 6 weeks for trend confirmation
-    elif 53 <= period_value <= 104:  # 1 to 2 years
-        ma_window = 50  # Long-term trend (50-week SMA)
-        recent_weeks = 8  # Use last 8 weeks for trend confirmation
-    else:  # More than 2 years
-        ma_window = 50  # Default to 50-week SMA
-        recent_weeks = 10  # Use last 10 weeks for trend confirmation
+    ma_window, recent_weeks = next(
+        (config for max_weeks, config in PERIOD_BUCKETS if period_weeks <= max_weeks),
+        (50, 10),  # More than 2 years: 50-week SMA, last 10 weeks
+    )
 
     # Compute the selected moving average
-    df[f"SMA_{ma_window}"] = df["Close"].rolling(window=ma_window).mean()
+    sma = np.empty((len(close), 1))
+    ma_multi(close, np.array([ma_window], dtype=np.int64), sma)
+    sma = sma[:, 0]
 
     # Count how many of the last N weeks had price increases
-    df["Price_Increase_Weeks"] = df["Close"].diff().fillna(0) > 0
-    recent_price_increases = df["Price_Increase_Weeks"].tail(recent_weeks).sum()
+    prev_close = np.concatenate((close[:1], close[:-1]))
+    price_change = close - prev_close  # 0 for the first week, NaN never counts
+    recent_price_increases = int((price_change[-recent_weeks:] > 0).sum())
 
     # Ensure the stock is above its moving average and that the moving average is rising
-    is_above_sma = df["Close"].iloc[-1] > df[f"SMA_{ma_window}"].iloc[-1]
-    is_sma_rising = df[f"SMA_{ma_window}"].iloc[-1] > df[f"SMA_{ma_window}"].iloc[-2]
+    is_above_sma = bool(close[-1] > sma[-1])
+    is_sma_rising = bool(sma[-1] > sma[-2])
 
     # Final Uptrend condition based on period
     if recent_price_increases >= recent_weeks * 0.75 and is_above_sma and is_sma_rising:
@@ -125,15 +132,6 @@ def volume_analysis(ticker, period="6mo"):
     # Avoid division by zero
     total_weeks = max(len(df), 1)  # Ensure at least 1 to prevent division by zero
 
-    # Calculate weighted accumulation based on volume strength
-    df["Volume_Strength"] = df["Volume"] / df["10_Week_MA_Volume"]
-    df["Volume_Strength"].replace(
-        [np.inf, -np.inf], np.nan, inplace=True
-    )  # Replace infinite values
-    df["Volume_Strength"].fillna(0, inplace=True)  # Replace NaN with 0
-
-    weighted_accumulation = df.loc[df["Accumulation_Day"], "Volume_Strength"].sum()
-
     # Compute sentiment score, ensuring no invalid values
     sentiment_score = (
         (2 * weighted_accumulation) - (1.5 * pullback_count)
@@ -144,23 +142,12 @@ def volume_analysis(ticker, period="6mo"):
         sentiment_score = 0  # Default to 0 if invalid
 
     # Ensure sentiment score is a standard Python float
-    sentiment_score = round(
-        float(sentiment_score), 2
-    )  # Determine institutional activity based on sentiment score
-    if sentiment_score > 0.3:
-        institution_activity = "strong institutional accumulation and bullish momentum."
-    elif sentiment_score > 0.1:
-        institution_activity = "moderate accumulation with potential bullish trend."
-    elif sentiment_score < -0.1:
-        institution_activity = (
-            "potential distribution, suggesting institutional selling pressure."
-        )
-    elif sentiment_score < -0.3:
-        institution_activity = "high distribution, indicating possible downtrend."
-    else:
-        institution_activity = (
-            "mixed activity, with no clear sign of accumulation or distribution."
-        )
+    sentiment_score = round(float(sentiment_score), 2)
+
+    # Determine institutional activity based on sentiment score
+    institution_activity = INSTITUTION_ACTIVITY[
+        np.searchsorted(SENTIMENT_BINS, sentiment_score, side="right")
+    ]
 
     insights = {
         "Ticker": ticker,
@@ -175,58 +162,142 @@ def volume_analysis(ticker, period="6mo"):
             f"This suggests {institution_activity}"
         ),
     }
-    # Convert DataFrame to JSON-serializable format
-    data_json = df[
-        [
-            "Date",
-            "Close",
-            "Volume",
-            "10_Week_MA_Volume",
-            "Accumulation_Day",
-            "Low_Volume_Pullback",
-        ]
-    ].copy()
-
-    data_json["Date"] = data_json["Date"].astype(str)  # Convert dates to string
-    data_json.fillna(0, inplace=True)  # Ensure no NaN values before converting
-    data_json = data_json.to_dict(
-        orient="records"
-    )  # Convert DataFrame to list of dictionaries
+    if not include_data:
+        return {"insights": insights}
+
+    # Build the JSON-serializable rows straight from the arrays (no NaN allowed)
+    dates = df["Date"].dt.strftime("%Y-%m-%d").tolist()
+    data_json = [
+        {
+            "Date": date,
+            "Close": c,
+            "Volume": v,
+            "10_Week_MA_Volume": ma,
+            "Accumulation_Day": accumulation,
+            "Low_Volume_Pullback": pullback,
+        }
+        for date, c, v, ma, accumulation, pullback in zip(
+            dates,
+            np.nan_to_num(close).tolist(),
+            np.nan_to_num(volume).astype(np.int64).tolist(),
+            ma10_vol.tolist(),
+            accumulation_day.tolist(),
+            low_volume_pullback.tolist(),
+        )
+    ]
 
     return {
-        # "data": data_json,  # JSON-serializable format
+        "data": data_json,  # JSON-serializable format
         "insights": insights,
     }
 
 
-def search_high_volume_tickers(market="sp500", period="6mo", min_volume_factor=1.5):
-    high_volume_tickers = []
-
+def get_market_tickers(market):
     if market == "sp500":
-        tickers = sd.get_sp500_tickers()
+        return sd.get_sp500_tickers()
     elif market == "hkex":
-        tickers = sd.convert_to_yahoo_format(sd.get_hk_mainboard_equities())
+        return sd.convert_to_yahoo_format(sd.get_hk_mainboard_equities())
     else:
         raise ValueError("Supported markets: 'sp500', 'hkex'")
 
-    for ticker in tickers:
-        time.sleep(2)
-        try:
-            stock = yf.Ticker(ticker)
-            df = stock.history(period=period, interval="1wk")
 
-            if df.empty or "Volume" not in df or len(df) < 10:
-                continue
+def is_high_volume(volume, min_volume_factor):
+    """Check whether the latest weekly volume beats its 10-week average by min_volume_factor."""
+    volume = volume[~np.isnan(volume)]
+    if len(volume) < 10:
+        return False
+    return volume[-1] > volume[-10:].mean() * min_volume_factor
 
-            df["10_Week_MA_Volume"] = df["Volume"].rolling(window=10).mean().fillna(0)
 
-            latest_week_volume = df["Volume"].iloc[-1]
-            latest_ma_volume = df["10_Week_MA_Volume"].iloc[-1]
+def search_high_volume_tickers(
+    market="sp500", period="6mo", min_volume_factor=1.5, batch_size=100
+):
+    high_volume_tickers = []
 
-            if latest_week_volume > latest_ma_volume * min_volume_factor:
-                high_volume_tickers.append(ticker)
+    tickers = get_market_tickers(market)
 
+    # One bulk download per batch instead of one request per ticker
+    for start in range(0, len(tickers), batch_size):
+        batch = tickers[start : start + batch_size]
+        try:
+            data = yf.download(
+                batch,
+                period=period,
+                interval="1wk",
+                group_by="ticker",
+                threads=True,
+                progress=False,
+                session=SESSION,
+            )
         except Exception as e:
-            print(f"Error processing {ticker}: {e}")
+            logger.error("Error downloading %s to %s: %s", batch[0], batch[-1], e)
+            continue
+
+        downloaded = set(data.columns.get_level_values(0))
+        for ticker in batch:
+            if ticker not in downloaded or "Volume" not in data[ticker]:
+                continue
+            volume = data[ticker]["Volume"].to_numpy(np.float64)
+            if is_high_volume(volume, min_volume_factor):
+                high_volume_tickers.append(ticker)
 
     return high_volume_tickers
+
+
+async def search_high_volume_tickers_async(
+    market="sp500",
+    period="6mo",
+    min_volume_factor=1.5,
+    concurrency=16,
+    transport=None,
+):
+    """
+    Same screen as search_high_volume_tickers, but fetches the weekly bars of
+    all tickers concurrently from Yahoo's chart API instead of one at a time.
+
+    Parameters:
+    market (str): 'sp500' or 'hkex'.
+    period (str): Data range to fetch (default is '6mo').
+    min_volume_factor (float): How far the latest weekly volume must exceed its 10-week average.
+    concurrency (int): Maximum number of requests in flight.
+    transport (httpx.AsyncBaseTransport, optional): Transport for the HTTP client (for tests).
+
+    Returns:
+    list: Tickers whose latest weekly volume is unusually high.
+
+    Raises:
+    RuntimeError: If every chart request failed (e.g. Yahoo is blocking us), so
+    that an outage is not reported as "no high-volume tickers".
+    """
+    tickers = await asyncio.to_thread(get_market_tickers, market)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # True/False per ticker, or None when its bars could not be fetched
+    async def fetch(client, ticker):
+        async with semaphore:
+            try:
+                response = await client.get(
+                    YAHOO_CHART_URL.format(ticker=ticker),
+                    params={"range": period, "interval": "1wk"},
+                )
+                response.raise_for_status()
+                result = response.json()["chart"]["result"][0]
+                # Weeks without a print come back as null volumes (NaN here)
+                volume = np.array(
+                    result["indicators"]["quote"][0]["volume"], dtype=np.float64
+                )
+                return is_high_volume(volume, min_volume_factor)
+            except Exception as e:
+                logger.error("Error processing %s: %s", ticker, e)
+                return None
+
+    async with httpx.AsyncClient(
+        headers=YAHOO_HEADERS, timeout=10, transport=transport
+    ) as client:
+        flags = await asyncio.gather(*(fetch(client, t) for t in tickers))
+
+    if tickers and all(flag is None for flag in flags):
+        raise RuntimeError(
+            f"All {len(tickers)} Yahoo chart requests failed; no volume data to screen"
+        )
+    return [ticker for ticker, flag in zip(tickers, flags) if flag]
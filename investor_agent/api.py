@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from investor_agent.screener import (
     get_screened_hk_stocks,
@@ -5,16 +7,33 @@ from investor_agent.screener import (
     get_screened_hk_stocks_vol,
 )
 from investor_agent.analyze_stages import analyze_stock_stage2  # Import your function
-from investor_agent.analyze_volume import volume_analysis
+from investor_agent import kernels
+from investor_agent.analyze_volume import (
+    volume_analysis,
+    search_high_volume_tickers_async,
+)
 from investor_agent.stock_data import (
     get_hk_mainboard_equities,
     convert_to_yahoo_format,
     fetch_stock_data,
-    get_bulk_price_changes,  # New import added
+    fast_bulk_price_changes,
+    get_bars,
+    get_weekly_bars,
 )  # Import stock functions
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the Numba kernels before serving the first request
+    kernels.warmup()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# The analysis and data functions make blocking HTTP calls (yfinance,
+# HKEX, TradingView), so routes run them in worker threads with
+# asyncio.to_thread to keep the event loop free for other requests.
 
 
 @app.get("/analyze/stage2/{ticker}")
@@ -24,7 +43,8 @@ async def analyze_stock(ticker: str):
     Example: /analyze/stage2/AAPL
     """
     try:
-        result = analyze_stock_stage2(ticker)
+        df = await asyncio.to_thread(get_bars, ticker)
+        result = await asyncio.to_thread(analyze_stock_stage2, ticker, df)
         return {"status": "success", "data": result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -37,7 +57,9 @@ async def get_hk_yahoo_codes():
     Returns a list of Hong Kong stock Yahoo Finance codes (e.g., ["0001.HK", "1000.HK"]).
     """
     try:
-        hk_stocks = get_hk_mainboard_equities()  # Get HK stock codes
+        hk_stocks = await asyncio.to_thread(
+            get_hk_mainboard_equities
+        )  # Get HK stock codes
         yahoo_codes = convert_to_yahoo_format(
             hk_stocks
         )  # Convert to Yahoo Finance format
@@ -49,13 +71,16 @@ async def get_hk_yahoo_codes():
 
 
 @app.get("/analyze/volume/{ticker}")
-async def analyze_volume(ticker: str, period: str = "6mo"):
+async def analyze_volume(ticker: str, period: str = "6mo", include_data: bool = False):
     """
     API Endpoint: GET /analyze/volume/{ticker}
-    Example: /analyze/volume/AAPL?period=6mo
+    Example: /analyze/volume/AAPL?period=6mo&include_data=true
     """
     try:
-        result = volume_analysis(ticker, period)
+        weekly = await asyncio.to_thread(get_weekly_bars, ticker, period)
+        result = await asyncio.to_thread(
+            volume_analysis, ticker, period, include_data, weekly
+        )
         return {"status": "success", "data": result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -70,9 +95,9 @@ async def screened_hk_stocks(type: str = "t2"):
     try:
         match type:
             case "t2":
-                stock_codes = get_screened_hk_stocks()
+                stock_codes = await asyncio.to_thread(get_screened_hk_stocks)
             case "vol":
-                stock_codes = get_screened_hk_stocks_vol()
+                stock_codes = await asyncio.to_thread(get_screened_hk_stocks_vol)
 
         yahoo_codes = convert_to_yahoo_format(stock_codes)
 
@@ -89,7 +114,7 @@ async def screened_us_stocks():
     Returns a list of US stock Yahoo Finance codes that match the screening criteria.
     """
     try:
-        stock_codes = get_screened_us_stocks()
+        stock_codes = await asyncio.to_thread(get_screened_us_stocks)
 
         return {"status": "success", "data": stock_codes}
 
@@ -97,6 +122,24 @@ async def screened_us_stocks():
         return {"status": "error", "message": str(e)}
 
 
+@app.get("/stocks/screener/high-volume")
+async def screened_high_volume(
+    market: str = "sp500", period: str = "6mo", min_volume_factor: float = 1.5
+):
+    """
+    API Endpoint: GET /stocks/screener/high-volume
+    Example: /stocks/screener/high-volume?market=hkex&period=6mo&min_volume_factor=1.5
+    Returns the tickers whose latest weekly volume is well above their 10-week average.
+    """
+    try:
+        tickers = await search_high_volume_tickers_async(
+            market, period, min_volume_factor
+        )
+        return {"status": "success", "data": tickers}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
 @app.get("/stocks/close")
 async def get_bulk_closing_prices(tickers: str):
     """
@@ -107,7 +150,7 @@ async def get_bulk_closing_prices(tickers: str):
         ticker_list = [
             ticker.strip() for ticker in tickers.split(",") if ticker.strip()
         ]
-        result = get_bulk_price_changes(ticker_list)
+        result = await asyncio.to_thread(fast_bulk_price_changes, ticker_list)
         return {"status": "success", "data": result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
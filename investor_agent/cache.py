@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+class FileCache:
+    """
+    Small JSON file cache: each entry is stored as <directory>/<md5(key)>.json
+    holding {"ts": write time, "data": value}.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key, ttl=86400):
+        """
+        Return the data stored under key.
+
+        Parameters:
+        key (str): Cache key.
+        ttl (float): Maximum age of the entry in seconds (default is one day).
+
+        Returns:
+        The cached data, or None if the entry is missing, unreadable or stale.
+        """
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            if time.time() - entry["ts"] > ttl:
+                return None
+            return entry["data"]
+        except (KeyError, TypeError):  # valid JSON, but not a cache entry
+            return None
+
+    def set(self, key, data):
+        """Store JSON-serializable data under key."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temp file and swap it in, so readers never see a partial entry
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False, encoding="utf-8"
+        ) as f:
+            try:
+                json.dump({"ts": time.time(), "data": data}, f)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, self._path(key))
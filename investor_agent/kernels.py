@@ -0,0 +1,154 @@
+import numpy as np
+from numba import njit, types
+
+# Input arrays are typed read-only: pandas (copy-on-write) hands out read-only
+# views, and writable arrays are accepted for a read-only argument as well.
+_F8_IN = types.Array(types.float64, 1, "A", readonly=True)
+_I8_IN = types.Array(types.int64, 1, "A", readonly=True)
+
+
+# Explicit signatures make Numba compile (or load from NUMBA_CACHE_DIR) at import
+# time instead of on the first request that calls a kernel.
+@njit(types.void(_F8_IN, _I8_IN, types.float64[:, :]), cache=True, boundscheck=False)
+def ma_multi(close, windows, out):
+    """
+    Compute trailing simple moving averages for several windows in one pass.
+
+    Parameters:
+    close (np.ndarray): float64 price series.
+    windows (np.ndarray): int64 window lengths, one per output column.
+    out (np.ndarray): float64 array of shape (len(close), len(windows)) to fill.
+        Rows before a window is full, or whose window holds a NaN, are NaN
+        (same as pandas' rolling(window).mean()).
+    """
+    n = close.shape[0]
+    m = windows.shape[0]
+    sums = np.zeros(m)
+    nans = np.zeros(m, dtype=np.int64)
+    for i in range(n):
+        x = close[i]
+        x_nan = np.isnan(x)
+        for k in range(m):
+            w = windows[k]
+            # Add the new value and drop the one leaving the window
+            if x_nan:
+                nans[k] += 1
+            else:
+                sums[k] += x
+            if i >= w:
+                old = close[i - w]
+                if np.isnan(old):
+                    nans[k] -= 1
+                else:
+                    sums[k] -= old
+            if i + 1 >= w and nans[k] == 0:
+                out[i, k] = sums[k] / w
+            else:
+                out[i, k] = np.nan
+
+
+@njit(
+    types.UniTuple(types.float64, 3)(
+        _F8_IN, _F8_IN, _F8_IN, _F8_IN, _F8_IN, types.boolean[:], types.boolean[:]
+    ),
+    cache=True,
+    boundscheck=False,
+    error_model="numpy",
+)
+def analyze_volume_kernel(
+    close, high, low, volume, ma10_vol, accumulation_day, low_volume_pullback
+):
+    """
+    Flag accumulation days and low-volume pullbacks in a single pass.
+
+    Parameters:
+    close, high, low, volume (np.ndarray): float64 weekly bars.
+    ma10_vol (np.ndarray): float64 10-week moving average of volume (0 while warming up).
+    accumulation_day (np.ndarray): bool array filled with the accumulation flags.
+    low_volume_pullback (np.ndarray): bool array filled with the pullback flags.
+
+    Returns:
+    tuple: (accumulation count, pullback count, volume-weighted accumulation).
+    """
+    accumulation_count = 0.0
+    pullback_count = 0.0
+    weighted_accumulation = 0.0
+    prev_close = np.nan
+    prev_prev_close = np.nan
+    for i in range(close.shape[0]):
+        c = close[i]
+        h = high[i]
+        l = low[i]
+        v = volume[i]
+        ma = ma10_vol[i]
+
+        # Week-over-week change; 0 for the first week or a missing close
+        change = c - prev_close
+        if np.isnan(change):
+            change = 0.0
+        pct_change = c / prev_close - 1.0
+        if np.isnan(pct_change):
+            pct_change = 0.0
+
+        above_avg_volume = v > ma * 1.2  # Volume 20% above average
+        strong_price_increase = pct_change > 0.005  # At least 0.5% increase
+        closing_strong = (c - l) / (h - l) > 0.5  # Closes in top 50% of range
+        mild_pullback = pct_change > -0.05  # Decline is less than 5%
+        volatility_check = (h - l) / l < 0.08  # Weekly volatility under 8%
+        previous_uptrend = prev_close > prev_prev_close  # Prior week was an uptrend
+
+        accumulation = above_avg_volume and strong_price_increase and closing_strong
+        pullback = (
+            not above_avg_volume
+            and change < 0
+            and mild_pullback
+            and volatility_check
+            and previous_uptrend
+        )
+        accumulation_day[i] = accumulation
+        low_volume_pullback[i] = pullback
+
+        if accumulation:
+            accumulation_count += 1
+            # Weight by volume strength, ignoring weeks without a volume average
+            strength = v / ma
+            if np.isfinite(strength):
+                weighted_accumulation += strength
+        if pullback:
+            pullback_count += 1
+
+        prev_prev_close = prev_close
+        prev_close = c
+
+    return accumulation_count, pullback_count, weighted_accumulation
+
+
+@njit(types.UniTuple(types.float64, 2)(_F8_IN, _F8_IN), cache=True, boundscheck=False)
+def max_high_min_low(high, low):
+    """
+    Return (highest high, lowest low) of a period in a single pass over both arrays.
+    NaN values are skipped; a period without any values gives (NaN, NaN).
+    """
+    highest = -np.inf
+    lowest = np.inf
+    for i in range(high.shape[0]):
+        # Comparisons with NaN are False, so missing bars are skipped
+        if high[i] > highest:
+            highest = high[i]
+        if low[i] < lowest:
+            lowest = low[i]
+    if highest == -np.inf:
+        highest = np.nan
+    if lowest == np.inf:
+        lowest = np.nan
+    return highest, lowest
+
+
+def warmup():
+    """Run every kernel once on dummy data so no API request pays their startup cost."""
+    ma_multi(np.zeros(300), np.array([10, 200], dtype=np.int64), np.empty((300, 2)))
+    bars = np.zeros(30)
+    max_high_min_low(bars, bars)
+    analyze_volume_kernel(
+        bars, bars, bars, bars, bars, np.empty(30, dtype=bool), np.empty(30, dtype=bool)
+    )
@@ -1,4 +1,85 @@
+import json
+import logging
+import os
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from tradingview_screener import Query, col
+from investor_agent.cache import FileCache
+
+logger = logging.getLogger(__name__)
+
+# The screens only change meaningfully once a day, so results are reused for a while
+SCREENER_TTL = float(os.environ.get("SCREENER_CACHE_TTL", 6 * 60 * 60))
+_cache = FileCache(os.environ.get("SCREENER_CACHE_DIR", ".cache/screener"))
+
+# The screens are constant, so their queries are built once at import.
+# Large-cap, high-beta HK stocks above their 50/100/200-day SMAs
+_HK_QUERY = (
+    Query()
+    .set_markets("hongkong")
+    .select("name")
+    .where(
+        col("market_cap_basic") > 10_000_000_000,
+        col("beta_1_year") > 1,
+        col("close") > col("SMA50"),
+        col("close") > col("SMA100"),
+        col("close") > col("SMA200"),
+        col("Value.Traded|1M") > 8_000_000,
+    )
+    .limit(1000)
+)
+
+# HK stocks with unusually high volume and meaningful liquidity
+_HK_VOL_QUERY = (
+    Query()
+    .set_markets("hongkong")
+    .select("name")
+    .where(
+        # 50% higher than normal 10-day volume
+        col("relative_volume_10d_calc|1M") > 1.5,
+        # More than 100% volume increase compared to prior month
+        col("volume_change|1M") > 100,
+        col("average_volume_30d_calc|1M") > 100_000,  # Avoid illiquid stocks
+        col("Value.Traded|1M") > 8_000_000,  # Meaningful institutional liquidity
+        col("close") > 2,
+    )
+    # .order_by("relative_volume_10d_calc|1M", ascending=False)
+    .limit(100)
+)
+
+# Large-cap, high-beta US stocks above their 50/100/200-day SMAs
+_US_QUERY = (
+    Query()
+    .set_markets("america")
+    .set_property("preset", "all_stocks")
+    .select("name")
+    .where(
+        col("market_cap_basic") > 2_000_000_000,
+        col("beta_1_year") > 1,
+        col("close") > col("SMA50"),
+        col("close") > col("SMA100"),
+        col("close") > col("SMA200"),
+        col("Value.Traded|1M") > 900_000_000,
+    )
+    .order_by("relative_volume_10d_calc|1M", ascending=False)
+    .limit(100)
+)
+
+
+def run_query(query):
+    """
+    Return the scanner DataFrame for a query, served from the file cache when
+    the same query ran within SCREENER_TTL seconds.
+    """
+    # The request payload (markets, columns, filters, sort, limit) identifies the screen
+    key = json.dumps([query.url, query.query], sort_keys=True, default=str)
+    cached = _cache.get(key, ttl=SCREENER_TTL)
+    if cached is not None:
+        return pd.DataFrame(cached["data"], columns=cached["columns"])
+
+    _, df = query.get_scanner_data()
+    _cache.set(key, df.to_dict(orient="split", index=False))
+    return df
 
 
 def get_screened_hk_stocks():
@@ -9,24 +90,7 @@ def get_screened_hk_stocks():
         list: A list of stock codes that match the criteria.
     """
     try:
-        query = (
-            Query()
-            .set_markets("hongkong")
-            .select("name")
-            .where(
-                col("market_cap_basic") > 10_000_000_000,
-                col("beta_1_year") > 1,
-                col("close") > col("SMA50"),
-                col("close") > col("SMA100"),
-                col("close") > col("SMA200"),
-                col("Value.Traded|1M") > 8_000_000,
-            )
-            .limit(1000)
-        )
-
-        screener_data = query.get_scanner_data()
-
-        _, df = screener_data
+        df = run_query(_HK_QUERY)
 
         # Drop the 'Ticker' column if it exists
         df = df.drop(columns=["Ticker"], errors="ignore")
@@ -42,37 +106,13 @@ def get_screened_hk_stocks():
 
 
 def get_screened_hk_stocks_vol():
-    print("Before Query")
     try:
-        query = (
-            Query()
-            .set_markets("hongkong")
-            .select(
-                "name",
-            )
-            .where(
-                col("relative_volume_10d_calc|1M")
-                > 1.5,  # 50% higher than normal 10-day volume
-                col("volume_change|1M")
-                > 100,  # More than 100% volume increase compared to prior month
-                col("average_volume_30d_calc|1M") > 100_000,  # Avoid illiquid stocks
-                col("Value.Traded|1M")
-                > 8_000_000,  # Meaningful institutional liquidity
-                col("close") > 2,
-            )
-            # .order_by("relative_volume_10d_calc|1M", ascending=False)
-            .limit(100)
-        )
-        print("Start Query")
-
-        screener_data = query.get_scanner_data()
-
-        _, df = screener_data
+        df = run_query(_HK_VOL_QUERY)
 
         # Drop the 'Ticker' column if it exists
         df = df.drop(columns=["Ticker"], errors="ignore")
 
-        print("Columns found in Excel:", df.columns.tolist())
+        logger.debug("Columns found in screener data: %s", df.columns.tolist())
 
         # Rename the "name" column to "Stock Code"
         df = df.rename(columns={"name": "Stock Code"})
@@ -91,26 +131,7 @@ def get_screened_us_stocks():
         list: A list of stock codes that match the criteria.
     """
     try:
-        query = (
-            Query()
-            .set_markets("america")
-            .set_property("preset", "all_stocks")
-            .select("name")
-            .where(
-                col("market_cap_basic") > 2_000_000_000,
-                col("beta_1_year") > 1,
-                col("close") > col("SMA50"),
-                col("close") > col("SMA100"),
-                col("close") > col("SMA200"),
-                col("Value.Traded|1M") > 900_000_000,
-            )
-            .order_by("relative_volume_10d_calc|1M", ascending=False)
-            .limit(100)
-        )
-
-        screener_data = query.get_scanner_data()
-
-        _, df = screener_data
+        df = run_query(_US_QUERY)
 
         # Drop the 'Ticker' column if it exists
         df = df.drop(columns=["ticker"], errors="ignore")
@@ -120,3 +141,23 @@ def get_screened_us_stocks():
 
     except Exception as e:
         return {"error": str(e)}
+
+
+def get_all_screened():
+    """
+    Run the HK, HK volume and US screens concurrently instead of one after another.
+
+    Returns:
+        tuple: Results of get_screened_hk_stocks, get_screened_hk_stocks_vol
+        and get_screened_us_stocks, in that order.
+    """
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(screen)
+            for screen in (
+                get_screened_hk_stocks,
+                get_screened_hk_stocks_vol,
+                get_screened_us_stocks,
+            )
+        ]
+        return tuple(future.result() for future in futures)
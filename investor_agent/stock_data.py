@@ -1,16 +1,103 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+import lxml.html
 import requests
 import yfinance as yf
-from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from investor_agent._yf_cache import SESSION, get_history
+
+logger = logging.getLogger(__name__)
+
+# yfinance period units and the matching pd.DateOffset keyword
+PERIOD_UNITS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+SP500_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+# Wikipedia rejects requests without a descriptive User-Agent
+WIKIPEDIA_HEADERS = {"User-Agent": "InvestorAgent/1.0 (S&P 500 ticker list)"}
+# Symbol cells (first column) of the first wikitable, the constituents table
+SP500_SYMBOLS_XPATH = '(//table[contains(@class, "wikitable")])[1]/tbody/tr/td[1]'
+
+HKEX_SECURITIES_URL = "https://www.hkex.com.hk/eng/services/trading/securities/securitieslists/ListOfSecurities.xlsx"
+
+# Keep-alive session for the HKEX and Wikipedia ticker lists, so repeated
+# fetches skip the TLS handshake
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(
+            total=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504)
+        ),
+    ),
+)
+
+# Where downloaded HKEX files are kept between calls
+HKEX_CACHE_DIR = os.environ.get("HKEX_CACHE_DIR", ".cache/hkex")
+
+# url -> conditional request headers (ETag / Last-Modified) of the file on disk
+_hkex_downloads = {}
 
 
 def fetch_stock_data(ticker, period="6mo", interval="1d"):
-    stock = yf.Ticker(ticker)
-    df = stock.history(period=period, interval=interval)
+    df = get_history(ticker, period=period, interval=interval)
     df = df[["Close"]]
     return df
 
 
+def get_bars(ticker, max_period="2y"):
+    """Daily bars for the longest window any analysis needs, shared through the history cache."""
+    return get_history(ticker, period=max_period)
+
+
+def period_offset(period):
+    """Convert a yfinance period such as '6mo' or '2y' to a pd.DateOffset (None if not fixed-length)."""
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not match:
+        return None
+    return pd.DateOffset(**{PERIOD_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def to_weekly(df_daily):
+    """
+    Resample daily OHLCV bars into Monday-Friday weekly bars, each labelled with
+    the week's last trading day (so an unfinished week is never dated in the future).
+    """
+    weeks = df_daily.resample("W-FRI")
+    weekly = weeks.agg(
+        {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    )
+    weekly.index = pd.DatetimeIndex(
+        df_daily.index.to_series().resample("W-FRI").max(), name=df_daily.index.name
+    )
+    return weekly.dropna(subset=["Close"])  # weeks without any trading day
+
+
+def get_weekly_bars(ticker, period, max_period="2y"):
+    """
+    Weekly bars for ticker over period, derived from the cached daily bars
+    when period fits inside max_period so no extra download is needed.
+    """
+    offset, max_offset = period_offset(period), period_offset(max_period)
+    now = pd.Timestamp.now()
+    if offset is None or now - offset < now - max_offset:
+        return get_history(ticker, period=period, interval="1wk")
+
+    daily = get_bars(ticker, max_period)
+    if daily.empty:
+        return daily
+    daily = daily[daily.index > daily.index[-1] - offset]
+    return to_weekly(daily)
+
+
 def load_stock_data(ticker, start="2023-01-01", end="2024-01-01"):
     """
     Fetch historical stock data from yfinance.
@@ -23,50 +110,88 @@ def load_stock_data(ticker, start="2023-01-01", end="2024-01-01"):
     Returns:
         pd.DataFrame: Dataframe containing 'Close', 'High', 'Low', 'Volume'.
     """
-    stock = yf.Ticker(ticker)
-    data = stock.history(start=start, end=end, interval="1d")  # Daily data
+    data = get_history(ticker, start=start, end=end, interval="1d")  # Daily data
     if data.empty:
         raise ValueError(f"No data fetched for ticker {ticker}")
     return data
 
 
+def fetch_hkex_file(url=HKEX_SECURITIES_URL):
+    """
+    Download a file from HKEX into HKEX_CACHE_DIR and return its path.
+
+    The body is streamed to disk instead of being held in memory, and the previous
+    download is revalidated with its ETag / Last-Modified so an unchanged file is
+    not transferred again (HTTP 304).
+
+    Raises requests.exceptions.RequestException when the download fails.
+    """
+    path = os.path.join(HKEX_CACHE_DIR, url.rsplit("/", 1)[-1])
+    validators = _hkex_downloads.get(url) if os.path.exists(path) else None
+    with _HTTP_SESSION.get(
+        url, headers=validators or {}, timeout=10, stream=True
+    ) as response:
+        if response.status_code == 304 and validators:
+            return path
+        response.raise_for_status()
+
+        # Write next to the target and swap it in, so readers never see a partial file
+        os.makedirs(HKEX_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=HKEX_CACHE_DIR, suffix=".part", delete=False
+        ) as f:
+            try:
+                response.raw.decode_content = True  # undo gzip transfer encoding
+                shutil.copyfileobj(response.raw, f)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+        validators = {}
+        if "ETag" in response.headers:
+            validators["If-None-Match"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            validators["If-Modified-Since"] = response.headers["Last-Modified"]
+    _hkex_downloads[url] = validators
+    return path
+
+
 def get_hk_mainboard_equities():
-    url = "https://www.hkex.com.hk/eng/services/trading/securities/securitieslists/ListOfSecurities.xlsx"
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        path = fetch_hkex_file()
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from HKEX: {e}")
+        logger.error("Error fetching data from HKEX: %s", e)
         return pd.DataFrame(columns=["Stock Code"])
 
     try:
-        # Read the Excel file
-        xls = pd.ExcelFile(BytesIO(response.content))
+        # Read the first sheet with the Rust-backed calamine engine
         df = pd.read_excel(
-            xls, sheet_name=xls.sheet_names[0], skiprows=2, dtype={"Stock Code": str}
+            path,
+            sheet_name=0,
+            skiprows=2,
+            dtype={"Stock Code": str},
+            engine="calamine",
+            # Only parse the columns we filter on; raises if any is missing
+            usecols=["Stock Code", "Category", "Sub-Category"],
         )
 
-        # Print the actual columns for debugging
-        print("Columns found in Excel:", df.columns.tolist())
-
-        # Ensure required columns exist before filtering
-        required_columns = {"Stock Code", "Category", "Sub-Category"}
-        if not required_columns.issubset(set(df.columns)):
-            print("Warning: Required columns not found in the file!")
-            return pd.DataFrame(columns=["Stock Code"])
+        logger.debug("Columns found in Excel: %s", df.columns.tolist())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("First rows:\n%s", df.head(5))
 
-        print(df.head(5))
-
-        mainboard_equities = df[
-            (df["Category"] == "Equity")
-            & (df["Sub-Category"] == "Equity Securities (Main Board)")
-        ]
+        # Filter and pad the raw arrays, so the only frame built is the result
+        mask = (df["Category"].to_numpy() == "Equity") & (
+            df["Sub-Category"].to_numpy() == "Equity Securities (Main Board)"
+        )
+        # Codes stored as numbers in the workbook lose their leading zeros
+        codes = np.char.zfill(df["Stock Code"].to_numpy()[mask].astype(str), 5)
 
-        print("Total number of stocks (rows):", len(mainboard_equities))
-        return mainboard_equities[["Stock Code"]]
+        logger.debug("Total number of stocks (rows): %d", len(codes))
+        return pd.DataFrame({"Stock Code": codes})
 
     except Exception as e:
-        print(f"Error processing Excel file: {e}")
+        logger.error("Error processing Excel file: %s", e)
         return pd.DataFrame(columns=["Stock Code"])
 
 
@@ -75,70 +200,143 @@ def convert_to_yahoo_format(df):
     if df.empty:
         return df
 
-    def format_yahoo_code(stock_code):
-        # Ensure stock code is always 4 digits
-        stock_code = stock_code.zfill(4)
-        return stock_code + ".HK"
-
-    return df["Stock Code"].apply(format_yahoo_code).tolist()
+    codes = df["Stock Code"].astype(str)
+    # Numeric codes lose their leading zeros and are padded back to 4 digits in
+    # one vectorized pass; anything non-numeric is passed through unchanged
+    as_int = pd.to_numeric(codes, errors="coerce")
+    padded = as_int.astype("Int64").astype(str).str.zfill(4)
+    return (padded.where(as_int.notna(), codes) + ".HK").tolist()
 
 
 def get_sp500_tickers():
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
     try:
-        tables = pd.read_html(url)
-        sp500_tickers = tables[0]["Symbol"].tolist()
-        return sp500_tickers
+        response = _HTTP_SESSION.get(SP500_URL, headers=WIKIPEDIA_HEADERS, timeout=10)
+        response.raise_for_status()
+        # Pull the symbol cells straight out of the DOM instead of turning
+        # every table on the page into a DataFrame
+        cells = lxml.html.fromstring(response.content).xpath(SP500_SYMBOLS_XPATH)
+        sp500_tickers = [cell.text_content().strip() for cell in cells]
+        return [ticker for ticker in sp500_tickers if ticker]
     except Exception as e:
-        print(f"Error fetching S&P 500 tickers: {e}")
+        logger.error("Error fetching S&P 500 tickers: %s", e)
         return []
 
 
 def get_hkex_tickers():
-    url = "https://www.hkex.com.hk/eng/services/trading/securities/securitieslists/ListOfSecurities.xlsx"
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        df = pd.read_excel(BytesIO(response.content), skiprows=2)
-        df = df[df.iloc[:, 2].str.contains("Equity", na=False)]
+        # Only parse the code (1st) and category (3rd) columns
+        df = pd.read_excel(
+            fetch_hkex_file(), skiprows=2, engine="calamine", usecols=[0, 2]
+        )
+        df = df[df.iloc[:, 1].str.contains("Equity", na=False)]
         hkex_tickers = df.iloc[:, 0].astype(str).str.zfill(4) + ".HK"
         return hkex_tickers.tolist()
     except Exception as e:
-        print(f"Error fetching HKEX tickers: {e}")
+        logger.error("Error fetching HKEX tickers: %s", e)
         return []
 
 
+def download_in_batches(
+    ticker_list, batch_size=10, max_workers=8, fields=None, **kwargs
+):
+    """
+    yf.download ticker_list in batches of batch_size on a thread pool and join
+    the per-batch frames side by side (columns grouped by ticker, one group per
+    distinct ticker).
+
+    When fields is given (e.g. ["Close"]), each batch is cut down to those price
+    columns before joining. Extra keyword arguments (period, interval, ...) are
+    passed to yf.download.
+    """
+    # A ticker listed twice would otherwise land in two batches and come back as
+    # duplicate columns; callers reindex the result to their own list
+    unique = list(dict.fromkeys(ticker_list))
+    batches = [unique[i : i + batch_size] for i in range(0, len(unique), batch_size)]
+
+    def download(batch):
+        df = yf.download(
+            batch,
+            group_by="ticker",
+            threads=False,
+            progress=False,
+            session=SESSION,
+            **kwargs,
+        )
+        if df is None or fields is None:
+            return df
+        return df.loc[:, df.columns.get_level_values(1).isin(fields)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = [df for df in executor.map(download, batches) if df is not None]
+    frames = [df for df in frames if not df.empty]
+    return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+
 def get_bulk_price_changes(ticker_list):
+    """Same as fast_bulk_price_changes; kept for existing callers."""
+    return fast_bulk_price_changes(ticker_list)
+
+
+def last_two_closes(closes):
+    """
+    Latest and previous non-NaN close per column of a (dates x tickers) array.
+
+    Returns:
+        tuple: (latest, previous, count) arrays; count is the number of valid closes.
     """
-    Get current price and percent change from previous close for multiple tickers.
+    valid = ~np.isnan(closes)
+    count = valid.sum(axis=0)
+    # Stable sort moves each column's valid rows to the top, still in date order
+    order = np.argsort(~valid, axis=0, kind="stable")
+    columns = np.arange(closes.shape[1])
+    latest = closes[order[np.maximum(count - 1, 0), columns], columns]
+    previous = closes[order[np.maximum(count - 2, 0), columns], columns]
+    return latest, previous, count
+
+
+def price_change_records(data, ticker_list):
+    """Turn a yf.download(group_by="ticker") frame into per-ticker price change dicts."""
+    if data is None or data.empty:
+        return [
+            {"ticker": ticker, "error": "Not enough data"} for ticker in ticker_list
+        ]
+
+    closes = data.xs("Close", axis=1, level=1).reindex(columns=ticker_list)
+    latest, previous, count = last_two_closes(closes.to_numpy(np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = (latest - previous) / previous * 100
+
+    # One frame constructor for all tickers instead of a dict per ticker in Python
+    records = pd.DataFrame(
+        {
+            "ticker": ticker_list,
+            "current_price": np.round(latest, 2),
+            "previous_close": np.round(previous, 2),
+            "change_percent": np.round(change, 2),
+        }
+    ).to_dict(orient="records")
+    # Tickers with fewer than two closes get an error record instead
+    for i in np.flatnonzero(count < 2):
+        records[i] = {"ticker": ticker_list[i], "error": "Not enough data"}
+    return records
+
+
+def fast_bulk_price_changes(ticker_list, period="5d"):
+    """
+    Get current price and percent change from previous close for multiple tickers
+    with one bulk download, computing the changes for all tickers at once.
+
+    Five days of bars are fetched by default so every ticker has two closes even
+    when its market was shut on one of the last trading days of another.
 
     Args:
         ticker_list (list): List of ticker symbols.
+        period (str): How much daily history to download (default is '5d').
 
     Returns:
         List of dictionaries with ticker data.
     """
-    data = yf.download(ticker_list, period="2d", group_by="ticker", auto_adjust=True)
-
-    result = []
-    for ticker in ticker_list:
-        try:
-            close_prices = data[ticker]["Close"]
-            if len(close_prices) < 2:
-                result.append({"ticker": ticker, "error": "Not enough data"})
-                continue
-            previous_close = close_prices[-2]
-            current_price = close_prices[-1]
-            change_percent = ((current_price - previous_close) / previous_close) * 100
-            result.append(
-                {
-                    "ticker": ticker,
-                    "current_price": round(current_price, 2),
-                    "previous_close": round(previous_close, 2),
-                    "change_percent": round(change_percent, 2),
-                }
-            )
-        except Exception as e:
-            result.append({"ticker": ticker, "error": str(e)})
-
-    return result
+    data = download_in_batches(
+        ticker_list, fields=["Close"], period=period, interval="1d", actions=False
+    )
+    return price_change_records(data, ticker_list)
@@ -1,5 +1,3 @@
-import yfinance as yf
-import matplotlib.pyplot as plt
 import os
 
 
@@ -16,32 +14,43 @@ def plot_stock_price(ticker, start="2023-01-01", end="2024-01-01", save_path=Non
     Returns:
         None
     """
+    # Imported here so importing this module doesn't pull in matplotlib/yfinance
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+    from investor_agent._yf_cache import get_history
+
     try:
         # Load stock data
-        stock = yf.Ticker(ticker)
-        data = stock.history(start=start, end=end)
+        data = get_history(ticker, start=start, end=end)
 
         if data.empty:
             print(f"⚠ No data found for {ticker} between {start} and {end}.")
             return
 
-        # Plot stock price
-        plt.figure(figsize=(12, 6))
-        plt.plot(
-            data.index, data["Close"], label=f"{ticker} Closing Price", linewidth=2
-        )
-        plt.title(f"{ticker} Stock Price ({start} to {end})")
-        plt.xlabel("Date")
-        plt.ylabel("Price")
-        plt.legend()
-
-        # Save or show the plot
-        if save_path:
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            plt.savefig(save_path)
-            print(f"📊 Chart saved: {save_path}")
-        else:
-            plt.show()
+        # ~2000 points are plenty for a 1200px-wide chart; thin out longer histories
+        close = data["Close"].iloc[:: max(1, len(data) // 2000)]
+
+        # A bare Figure renders with Agg and is never registered with pyplot, so
+        # saved charts don't accumulate in memory across calls
+        fig = Figure(figsize=(12, 6)) if save_path else plt.figure(figsize=(12, 6))
+        try:
+            # Plot stock price
+            ax = fig.subplots()
+            ax.plot(close.index, close, label=f"{ticker} Closing Price", linewidth=2)
+            ax.set_title(f"{ticker} Stock Price ({start} to {end})")
+            ax.set_xlabel("Date")
+            ax.set_ylabel("Price")
+            ax.legend()
+
+            # Save or show the plot
+            if save_path:
+                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                fig.savefig(save_path)
+                print(f"📊 Chart saved: {save_path}")
+            else:
+                plt.show()
+        finally:
+            plt.close(fig)
 
     except Exception as e:
         print(f"❌ Error fetching data for {ticker}: {e}")
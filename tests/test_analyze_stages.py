@@ -2,97 +2,93 @@ import pandas as pd
 import numpy as np
 import pytest
 import yfinance as yf
-from investor_agent.analyze_stages import analyze_stock_stage2
+import investor_agent._yf_cache as yf_cache
+from investor_agent._yf_cache import clear_cache, get_history, get_ticker
+from investor_agent.analyze_stages import (
+    analyze_stock_stage2,
+    calculate_moving_averages,
+    check_growth,
+    check_mas_trending_up,
+)
 
 
 # Define a dummy ticker class that returns preset data.
 class DummyTicker:
-    def __init__(self, ticker, df, income_stmt=None, financials=None):
+    def __init__(self, ticker, df, income_stmt=None):
         self.ticker = ticker
         self._df = df
         self.income_stmt = income_stmt
-        self.financials = financials
 
-    def history(self, period):
+    def history(self, period, interval="1d"):
         return self._df
 
 
-# Factory function to return a DummyTicker based on the ticker symbol.
+# Cached tickers and histories must not leak between tests.
+@pytest.fixture(autouse=True)
+def _clear_yf_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+# Price frames shared by every test, built once at import. analyze_stock_stage2
+# reads history through the cache, which hands out copies, so sharing is safe.
+DAYS = 300
+_INDEX = pd.date_range(end=pd.Timestamp.today().normalize(), periods=DAYS)
+# Strictly increasing prices over 300 days.
+_DF_UP = pd.DataFrame(
+    {
+        "Close": np.arange(100, 100 + DAYS, dtype=np.float64),  # steadily increasing
+        "High": np.arange(102, 102 + DAYS, dtype=np.float64),
+        "Low": np.arange(98, 98 + DAYS, dtype=np.float64),
+    },
+    index=_INDEX,
+)
+# Constant price over 300 days.
+_DF_FLAT = pd.DataFrame(
+    {
+        "Close": np.full(DAYS, 100.0),
+        "High": np.full(DAYS, 102.0),
+        "Low": np.full(DAYS, 98.0),
+    },
+    index=_INDEX,
+)
+# No "Close" column.
+_DF_MISSING = _DF_UP[["High", "Low"]]
+_DF_EMPTY = pd.DataFrame()
+
+# Simulate positive fundamentals by constructing an income statement
+# with Net Income and Total Revenue rows over four columns (e.g., Q1-Q4)
+_INCOME_GROWING = pd.DataFrame(
+    [[200, 150, 100, 50], [400, 300, 200, 100]],
+    index=["Net Income", "Total Revenue"],
+    columns=["Q1", "Q2", "Q3", "Q4"],
+)
+
+# ticker -> (price history, income statement). For TEST_UP, fundamentals are
+# not simulated (EPS remains False) but the rising prices yield a positive
+# relative strength.
+_TICKERS = {
+    "TEST_UP": (_DF_UP, None),
+    "TEST_BONUS_BOTH": (_DF_UP, _INCOME_GROWING),
+    "TEST_FLAT": (_DF_FLAT, None),
+    "EMPTY": (_DF_EMPTY, None),
+    "MISSING_CLOSE": (_DF_MISSING, None),
+}
+
+
+# Return a DummyTicker based on the ticker symbol (unknown symbols get rising prices).
 def dummy_ticker_factory(ticker):
-    days = 300
-    if ticker == "TEST_UP":
-        # Create a DataFrame with strictly increasing prices over 300 days.
-        data = {
-            "Close": np.arange(100, 100 + days),  # steadily increasing
-            "High": np.arange(102, 102 + days),
-            "Low": np.arange(98, 98 + days),
-        }
-        df = pd.DataFrame(data)
-        df.index = pd.date_range(end=pd.Timestamp.today(), periods=days)
-        # For TEST_UP, fundamentals are not simulated (EPS remains False)
-        # but the rising prices yield a positive relative strength.
-        return DummyTicker(ticker, df)
-    elif ticker == "TEST_BONUS_BOTH":
-        # Create a DataFrame with strictly increasing prices over 300 days.
-        data = {
-            "Close": np.arange(100, 100 + days),
-            "High": np.arange(102, 102 + days),
-            "Low": np.arange(98, 98 + days),
-        }
-        df = pd.DataFrame(data)
-        df.index = pd.date_range(end=pd.Timestamp.today(), periods=days)
-        # Simulate positive fundamentals by constructing DataFrames
-        # with a single row and four columns (e.g., Q1, Q2, Q3, Q4)
-        income_stmt = pd.DataFrame(
-            [[200, 150, 100, 50]],
-            index=["Net Income"],
-            columns=["Q1", "Q2", "Q3", "Q4"],
-        )
-        financials = pd.DataFrame(
-            [[400, 300, 200, 100]],
-            index=["Total Revenue"],
-            columns=["Q1", "Q2", "Q3", "Q4"],
-        )
-        return DummyTicker(ticker, df, income_stmt=income_stmt, financials=financials)
-    elif ticker == "TEST_FLAT":
-        # Create a DataFrame with constant price over 300 days.
-        data = {
-            "Close": np.full(days, 100),
-            "High": np.full(days, 102),
-            "Low": np.full(days, 98),
-        }
-        df = pd.DataFrame(data)
-        df.index = pd.date_range(end=pd.Timestamp.today(), periods=days)
-        return DummyTicker(ticker, df)
-    elif ticker == "EMPTY":
-        # Return an empty DataFrame.
-        df = pd.DataFrame()
-        return DummyTicker(ticker, df)
-    elif ticker == "MISSING_CLOSE":
-        # Create a DataFrame without the "Close" column.
-        data = {
-            "High": np.arange(102, 102 + days),
-            "Low": np.arange(98, 98 + days),
-        }
-        df = pd.DataFrame(data)
-        df.index = pd.date_range(end=pd.Timestamp.today(), periods=days)
-        return DummyTicker(ticker, df)
-    else:
-        # Default behavior: use increasing prices.
-        data = {
-            "Close": np.arange(100, 100 + days),
-            "High": np.arange(102, 102 + days),
-            "Low": np.arange(98, 98 + days),
-        }
-        df = pd.DataFrame(data)
-        df.index = pd.date_range(end=pd.Timestamp.today(), periods=days)
-        return DummyTicker(ticker, df)
+    df, income_stmt = _TICKERS.get(ticker, (_DF_UP, None))
+    return DummyTicker(ticker, df, income_stmt=income_stmt)
 
 
 # Test when all technical criteria are met (uptrend) with one bonus (RS only)
 def test_analyze_stock_stage2_up(monkeypatch):
     # Monkey-patch yf.Ticker so that our dummy data is used.
-    monkeypatch.setattr(yf, "Ticker", lambda ticker: dummy_ticker_factory(ticker))
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: dummy_ticker_factory(ticker)
+    )
     result = analyze_stock_stage2("TEST_UP")
 
     # Check that technical criteria are met.
@@ -110,7 +106,9 @@ def test_analyze_stock_stage2_up(monkeypatch):
 
 # Test when both bonus conditions are met.
 def test_analyze_stock_stage2_bonus_both(monkeypatch):
-    monkeypatch.setattr(yf, "Ticker", lambda ticker: dummy_ticker_factory(ticker))
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: dummy_ticker_factory(ticker)
+    )
     result = analyze_stock_stage2("TEST_BONUS_BOTH")
 
     # Technical criteria should be met.
@@ -128,7 +126,9 @@ def test_analyze_stock_stage2_bonus_both(monkeypatch):
 
 # Test when the technical criteria fail due to flat prices.
 def test_analyze_stock_stage2_flat(monkeypatch):
-    monkeypatch.setattr(yf, "Ticker", lambda ticker: dummy_ticker_factory(ticker))
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: dummy_ticker_factory(ticker)
+    )
     result = analyze_stock_stage2("TEST_FLAT")
 
     # With constant prices, the moving average sequence is not strictly descending.
@@ -144,7 +144,9 @@ def test_analyze_stock_stage2_flat(monkeypatch):
 
 # Test that an empty DataFrame raises an exception.
 def test_analyze_stock_stage2_empty(monkeypatch):
-    monkeypatch.setattr(yf, "Ticker", lambda ticker: dummy_ticker_factory(ticker))
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: dummy_ticker_factory(ticker)
+    )
     with pytest.raises(Exception) as excinfo:
         analyze_stock_stage2("EMPTY")
     assert "No data retrieved" in str(excinfo.value)
@@ -152,11 +154,82 @@ def test_analyze_stock_stage2_empty(monkeypatch):
 
 # Test that a DataFrame missing the "Close" column raises an exception.
 def test_analyze_stock_stage2_missing_close(monkeypatch):
-    monkeypatch.setattr(yf, "Ticker", lambda ticker: dummy_ticker_factory(ticker))
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: dummy_ticker_factory(ticker)
+    )
     with pytest.raises(Exception) as excinfo:
         analyze_stock_stage2("MISSING_CLOSE")
     assert "No data retrieved" in str(excinfo.value)
 
 
+# Test that the moving averages match pandas' rolling mean, including NaN gaps.
+def test_calculate_moving_averages_matches_rolling():
+    close = np.linspace(100, 160, 300)
+    close[[40, 250]] = np.nan
+    windows = [10, 20, 50, 100, 200, 150]
+    df, mas = calculate_moving_averages(
+        pd.DataFrame({"Close": close}), windows, join=True
+    )
+    for k, window in enumerate(windows):
+        expected = pd.Series(close).rolling(window=window).mean()
+        np.testing.assert_allclose(mas[:, k], expected, rtol=1e-12)
+        np.testing.assert_allclose(df[f"MA{window}"], expected, rtol=1e-12)
+
+
+# Test the MA trend check on falling prices and on too little history.
+def test_check_mas_trending_up():
+    falling = np.tile(np.arange(300, 0, -1, dtype=float)[:, None], (1, 5))
+    assert not check_mas_trending_up(falling)
+    # Fewer bars than any lookback: nothing to compare, so assume trending up.
+    assert check_mas_trending_up(falling[:3])
+
+
+# Test the growth check, including a zero prior value and too few periods.
+def test_check_growth():
+    def statement(values):
+        return pd.DataFrame([values], index=["Net Income"])
+
+    assert check_growth(statement([200, 150, 100, 50]), "Net Income")
+    # Only one growing period: 200 > 150; 150 < 180; 180 > 0 but zero prior counts as 0
+    assert not check_growth(statement([200, 150, 180, 0]), "Net Income")
+    assert not check_growth(statement([200, 150, 100]), "Net Income")
+    assert not check_growth(statement([200, 150, 100, 50]), "Total Revenue")
+
+
+# Test that Ticker objects (and the fundamentals they memoize) expire with the TTL.
+def test_get_ticker_expires(monkeypatch):
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: dummy_ticker_factory(ticker)
+    )
+    first = get_ticker("TEST_UP")
+    assert get_ticker("TEST_UP") is first
+
+    monkeypatch.setattr(yf_cache, "HISTORY_TTL", 0)
+    assert get_ticker("TEST_UP") is not first
+
+
+# Test that the in-process caches stay bounded, evicting least recently used entries.
+def test_yf_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: dummy_ticker_factory(ticker)
+    )
+    monkeypatch.setattr(yf_cache, "TICKER_CACHE_SIZE", 2)
+    monkeypatch.setattr(yf_cache, "HISTORY_CACHE_SIZE", 2)
+
+    get_history("A", period="1y")
+    get_history("B", period="1y")
+    get_history("A", period="1y")  # A is now the most recently used
+    get_history("C", period="1y")
+
+    assert list(yf_cache.history_cache) == [("A", "1y", "1d"), ("C", "1y", "1d")]
+    # The repeat of A was a history hit, so its Ticker was not touched
+    assert list(yf_cache.ticker_cache) == ["B", "C"]
+
+    # Expired entries are dropped on the next insert
+    monkeypatch.setattr(yf_cache, "HISTORY_TTL", 0)
+    get_history("D", period="1y")
+    assert len(yf_cache.history_cache) == 0
+
+
 if __name__ == "__main__":
     pytest.main(["-v"])
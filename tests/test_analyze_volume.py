@@ -0,0 +1,176 @@
+import asyncio
+import functools
+import httpx
+import pandas as pd
+import numpy as np
+import pytest
+import yfinance as yf
+from fastapi.testclient import TestClient
+import investor_agent.analyze_volume as analyze_volume
+import investor_agent.api as api
+from investor_agent._yf_cache import clear_cache
+from investor_agent.analyze_volume import (
+    search_high_volume_tickers,
+    search_high_volume_tickers_async,
+    volume_analysis,
+)
+
+
+# Define a dummy ticker class that returns preset weekly bars.
+class DummyTicker:
+    def __init__(self, ticker, df):
+        self.ticker = ticker
+        self._df = df
+
+    def history(self, period, interval="1d"):
+        return self._df
+
+
+# Thirteen weekly bars: a flat base, one high-volume breakout week,
+# then a quiet pullback week.
+def weekly_bars():
+    close = [100.0] * 11 + [110.0, 108.0]
+    high = [101.0] * 11 + [111.0, 110.0]
+    low = [99.0] * 11 + [100.0, 107.0]
+    volume = [100] * 11 + [1000, 100]
+    df = pd.DataFrame({"Close": close, "High": high, "Low": low, "Volume": volume})
+    df.index = pd.date_range(
+        end="2025-01-03", periods=len(df), freq="W-FRI", name="Date"
+    )
+    return df
+
+
+@pytest.fixture(autouse=True)
+def _dummy_yf(monkeypatch):
+    clear_cache()
+    monkeypatch.setattr(
+        yf, "Ticker", lambda ticker, session=None: DummyTicker(ticker, weekly_bars())
+    )
+    yield
+    clear_cache()
+
+
+# Test that the breakout week is an accumulation day and the quiet week a pullback.
+def test_volume_analysis_counts():
+    insights = volume_analysis("TEST")["insights"]
+
+    assert insights["Accumulation Days"] == 1
+    assert insights["Low Volume Pullbacks"] == 1
+    # (2 * 1000 / 190 - 1.5 * 1) / 13 weeks
+    assert insights["Sentiment Score"] == 0.69
+
+
+# Test that bars passed in by the caller are analyzed without being modified.
+def test_volume_analysis_leaves_df_untouched():
+    df = weekly_bars()
+    insights = volume_analysis("TEST", df=df)["insights"]
+
+    assert insights["Accumulation Days"] == 1
+    pd.testing.assert_frame_equal(df, weekly_bars())
+
+
+# Test that the weekly rows are only returned on request.
+def test_volume_analysis_include_data():
+    assert "data" not in volume_analysis("TEST")
+
+    data = volume_analysis("TEST", include_data=True)["data"]
+    assert len(data) == 13
+    assert data[-1]["Date"] == "2025-01-03"
+    assert data[-1]["Volume"] == 100
+    assert [row["Accumulation_Day"] for row in data].index(True) == 11
+    assert [row["Low_Volume_Pullback"] for row in data].index(True) == 12
+    assert np.isclose(data[11]["10_Week_MA_Volume"], 190.0)
+
+
+# Test the batched yf.download screen: tickers missing from the download,
+# NaN-padded volume and a batch whose download fails.
+def test_search_high_volume_tickers(monkeypatch):
+    index = pd.date_range(end="2025-01-03", periods=14, freq="W-FRI")
+    spike = [100.0] * 13 + [1000.0]
+    volumes = {
+        "SPIKE": spike,
+        "QUIET": [100.0] * 14,
+        # Listed recently: NaN before its first week, still 10 real weeks
+        "PADDED": [np.nan] * 4 + [100.0] * 9 + [1000.0],
+        "AFTER": spike,
+    }
+    frame = pd.concat(
+        {t: pd.DataFrame({"Volume": v}, index=index) for t, v in volumes.items()},
+        axis=1,
+    )
+
+    def download(batch, **kwargs):
+        if "BOOM" in batch:
+            raise ConnectionError("download failed")
+        return frame.loc[:, frame.columns.get_level_values(0).isin(batch)]
+
+    monkeypatch.setattr(yf, "download", download)
+    monkeypatch.setattr(
+        analyze_volume,
+        "get_market_tickers",
+        lambda market: ["SPIKE", "QUIET", "PADDED", "MISSING", "BOOM", "LOST", "AFTER"],
+    )
+
+    # Batches: [SPIKE, QUIET], [PADDED, MISSING], [BOOM, LOST], [AFTER]
+    assert search_high_volume_tickers(batch_size=2) == ["SPIKE", "PADDED", "AFTER"]
+
+
+# Yahoo chart API payload with the given weekly volumes.
+def chart_payload(volume):
+    return {"chart": {"result": [{"indicators": {"quote": [{"volume": volume}]}}]}}
+
+
+# Mock Yahoo chart API: SPIKE has a volume spike, QUIET does not, GAPS has
+# null weeks around a spike, DOWN fails and BAD returns an unexpected payload.
+def chart_handler(request):
+    ticker = request.url.path.rsplit("/", 1)[-1]
+    if ticker == "SPIKE":
+        return httpx.Response(200, json=chart_payload([100] * 9 + [1000]))
+    if ticker == "QUIET":
+        return httpx.Response(200, json=chart_payload([100] * 10))
+    if ticker == "GAPS":
+        return httpx.Response(200, json=chart_payload([100, None] * 5 + [1000]))
+    if ticker == "BAD":
+        return httpx.Response(200, json={"chart": {"result": None}})
+    return httpx.Response(429)
+
+
+# Test the concurrent screen's parsing, including null volumes and bad tickers.
+def test_search_high_volume_tickers_async(monkeypatch):
+    monkeypatch.setattr(
+        analyze_volume,
+        "get_market_tickers",
+        lambda market: ["SPIKE", "QUIET", "GAPS", "DOWN", "BAD"],
+    )
+
+    tickers = asyncio.run(
+        search_high_volume_tickers_async(transport=httpx.MockTransport(chart_handler))
+    )
+
+    # GAPS has only 6 real weeks once the nulls are dropped, too few to judge
+    assert tickers == ["SPIKE"]
+
+
+# Test that a run where every request fails is reported as an error, not as
+# "no high-volume tickers".
+def test_screened_high_volume_all_requests_fail(monkeypatch):
+    monkeypatch.setattr(
+        analyze_volume, "get_market_tickers", lambda market: ["DOWN", "BAD"]
+    )
+    monkeypatch.setattr(
+        api,
+        "search_high_volume_tickers_async",
+        functools.partial(
+            search_high_volume_tickers_async,
+            transport=httpx.MockTransport(chart_handler),
+        ),
+    )
+
+    response = TestClient(api.app).get("/stocks/screener/high-volume")
+
+    assert response.json()["status"] == "error"
+    assert "All 2 Yahoo chart requests failed" in response.json()["message"]
+
+
+if __name__ == "__main__":
+    pytest.main(["-v"])
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+import investor_agent.screener as screener
+from investor_agent.cache import FileCache
+
+
+# Test that entries round-trip and expire after their TTL.
+def test_file_cache_get_set(tmp_path):
+    cache = FileCache(str(tmp_path / "screener"))
+    assert cache.get("missing") is None
+
+    cache.set("key", {"rows": [1, 2]})
+    assert cache.get("key") == {"rows": [1, 2]}
+    assert cache.get("key", ttl=-1) is None  # stale
+    assert len(list((tmp_path / "screener").iterdir())) == 1  # no temp files left
+
+    # A value that can't be serialized leaves neither an entry nor a temp file
+    with pytest.raises(TypeError):
+        cache.set("bad", {"rows": object()})
+    assert cache.get("bad") is None
+    assert len(list((tmp_path / "screener").iterdir())) == 1
+
+    # Files that parse as JSON but aren't cache entries are treated as missing
+    for content in ("[1, 2]", '{"data": 1}', '{"ts": "yesterday", "data": 1}'):
+        with open(cache._path("key"), "w") as f:
+            f.write(content)
+        assert cache.get("key") is None
+
+
+# Test that a repeated screener query is answered from the cache.
+def test_run_query_uses_cache(monkeypatch, tmp_path):
+    class DummyQuery:
+        url = "https://scanner.tradingview.com/hongkong/scan"
+        query = {"columns": ["name"], "range": [0, 10]}
+        calls = 0
+
+        def get_scanner_data(self):
+            DummyQuery.calls += 1
+            return 1, pd.DataFrame({"ticker": ["HKEX:700"], "name": ["700"]})
+
+    monkeypatch.setattr(screener, "_cache", FileCache(str(tmp_path)))
+
+    first = screener.run_query(DummyQuery())
+    second = screener.run_query(DummyQuery())
+
+    assert DummyQuery.calls == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+if __name__ == "__main__":
+    pytest.main(["-v"])
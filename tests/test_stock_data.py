@@ -0,0 +1,286 @@
+import pandas as pd
+import numpy as np
+import pytest
+import functools
+import os
+from io import BytesIO
+import yfinance as yf
+import investor_agent.stock_data as stock_data
+from investor_agent._yf_cache import clear_cache
+from investor_agent.stock_data import (
+    convert_to_yahoo_format,
+    download_in_batches,
+    fast_bulk_price_changes,
+    fetch_hkex_file,
+    get_hk_mainboard_equities,
+    get_hkex_tickers,
+    get_sp500_tickers,
+    get_weekly_bars,
+    load_stock_data,
+    to_weekly,
+)
+
+
+# Build a yf.download(group_by="ticker") style frame from per-ticker closes.
+def download_frame(closes):
+    index = pd.date_range(end="2025-01-03", periods=3, freq="B")
+    return pd.concat(
+        {
+            ticker: pd.DataFrame(
+                {"Open": values, "Close": values, "Volume": 1000.0}, index=index
+            )
+            for ticker, values in closes.items()
+        },
+        axis=1,
+    )
+
+
+# yf.download stand-in that returns only the requested tickers' columns.
+def fake_download(data):
+    def download(tickers, **kwargs):
+        return data.loc[:, data.columns.get_level_values(0).isin(tickers)]
+
+    return download
+
+
+# Test that each ticker uses its own last two closes, skipping market holidays.
+def test_fast_bulk_price_changes(monkeypatch):
+    data = download_frame(
+        {
+            "AAPL": [100.0, 110.0, 121.0],
+            "0700.HK": [50.0, 40.0, np.nan],  # HK closed on the last day
+            "NEW": [np.nan, np.nan, 10.0],  # only one close
+        }
+    )
+    monkeypatch.setattr(yf, "download", fake_download(data))
+
+    # AAPL is listed again so it would fall into a second batch of two
+    tickers = ["AAPL", "0700.HK", "NEW", "MISSING", "AAPL"]
+    monkeypatch.setattr(
+        stock_data,
+        "download_in_batches",
+        functools.partial(download_in_batches, batch_size=2),
+    )
+    result = fast_bulk_price_changes(tickers)
+
+    assert result[0] == {
+        "ticker": "AAPL",
+        "current_price": 121.0,
+        "previous_close": 110.0,
+        "change_percent": 10.0,
+    }
+    assert result[1]["current_price"] == 40.0
+    assert result[1]["change_percent"] == -20.0
+    assert result[2] == {"ticker": "NEW", "error": "Not enough data"}
+    assert result[3] == {"ticker": "MISSING", "error": "Not enough data"}
+    assert len(result) == 5
+    assert result[4] == result[0]
+
+    # Only the Close columns survive the per-batch download
+    assert download_in_batches(["AAPL"], fields=["Close"]).columns.tolist() == [
+        ("AAPL", "Close")
+    ]
+
+
+# Test that re-requesting the same date range is served from the history cache.
+def test_load_stock_data_reuses_download(monkeypatch):
+    calls = []
+
+    class DummyTicker:
+        def history(self, **kwargs):
+            calls.append(kwargs)
+            return download_frame({"AAPL": [1.0, 2.0, 3.0]})["AAPL"]
+
+    clear_cache()
+    monkeypatch.setattr(yf, "Ticker", lambda ticker, session=None: DummyTicker())
+    try:
+        first = load_stock_data("AAPL", start="2024-01-01", end="2024-02-01")
+        first["Close"] = 0.0  # callers get their own copy
+        second = load_stock_data("AAPL", start="2024-01-01", end="2024-02-01")
+    finally:
+        clear_cache()
+
+    assert calls == [{"start": "2024-01-01", "end": "2024-02-01", "interval": "1d"}]
+    assert second["Close"].tolist() == [1.0, 2.0, 3.0]
+
+
+# Test that an unchanged HKEX file is revalidated instead of downloaded again.
+def test_fetch_hkex_file_revalidates(monkeypatch, tmp_path):
+    class Response:
+        def __init__(self, status_code, content=b"", headers=None):
+            self.status_code = status_code
+            self.raw = BytesIO(content)
+            self.headers = headers or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+        def raise_for_status(self):
+            pass
+
+    sent_headers = []
+
+    def get(url, headers, timeout, stream):
+        sent_headers.append(headers)
+        if headers:
+            return Response(304)
+        return Response(200, b"xlsx", {"ETag": '"v1"'})
+
+    monkeypatch.setattr(stock_data, "HKEX_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(stock_data, "_hkex_downloads", {})
+    monkeypatch.setattr(stock_data._HTTP_SESSION, "get", get)
+
+    path = fetch_hkex_file()
+    assert fetch_hkex_file() == path
+    assert sent_headers == [{}, {"If-None-Match": '"v1"'}]
+    assert open(path, "rb").read() == b"xlsx"
+    assert os.listdir(tmp_path) == ["ListOfSecurities.xlsx"]
+
+
+# Small workbook laid out like HKEX's ListOfSecurities.xlsx (two title rows,
+# then Stock Code / Name of Securities / Category / Sub-Category): two main
+# board equities (00001, 00002), a bond (04333) and a GEM equity (80011).
+HKEX_WORKBOOK = os.path.join(os.path.dirname(__file__), "data", "ListOfSecurities.xlsx")
+
+
+# Test that only main board equities are kept from the HKEX list.
+def test_get_hk_mainboard_equities(monkeypatch):
+    monkeypatch.setattr(stock_data, "fetch_hkex_file", lambda: HKEX_WORKBOOK)
+
+    df = get_hk_mainboard_equities()
+
+    assert df.columns.tolist() == ["Stock Code"]
+    assert df["Stock Code"].tolist() == ["00001", "00002"]
+    assert convert_to_yahoo_format(df) == ["0001.HK", "0002.HK"]
+
+
+# Test the HK code conversion described in the docstring.
+def test_convert_to_yahoo_format():
+    codes = pd.DataFrame({"Stock Code": ["00001", "01000", "80011", "1", "ABC"]})
+    assert convert_to_yahoo_format(codes) == [
+        "0001.HK",
+        "1000.HK",
+        "80011.HK",
+        "0001.HK",
+        "ABC.HK",
+    ]
+
+
+# Test that every equity row of the HKEX list becomes a Yahoo ticker.
+def test_get_hkex_tickers(monkeypatch):
+    monkeypatch.setattr(stock_data, "fetch_hkex_file", lambda: HKEX_WORKBOOK)
+
+    assert get_hkex_tickers() == ["0001.HK", "0002.HK", "80011.HK"]
+
+
+# Test that the symbols come from the first wikitable only.
+def test_get_sp500_tickers(monkeypatch):
+    page = b"""
+    <html><body>
+    <table class="infobox"><tbody><tr><td>not a symbol</td></tr></tbody></table>
+    <table class="wikitable sortable" id="constituents"><tbody>
+      <tr><th>Symbol</th><th>Security</th></tr>
+      <tr><td><a href="#">MMM</a></td><td>3M</td></tr>
+      <tr><td><a href="#">BRK.B</a>\n</td><td>Berkshire Hathaway</td></tr>
+    </tbody></table>
+    <table class="wikitable"><tbody><tr><td>OLD</td></tr></tbody></table>
+    </body></html>
+    """
+
+    class Response:
+        content = page
+
+        def raise_for_status(self):
+            pass
+
+    monkeypatch.setattr(
+        stock_data._HTTP_SESSION, "get", lambda url, headers, timeout: Response()
+    )
+
+    assert get_sp500_tickers() == ["MMM", "BRK.B"]
+
+
+# Daily OHLCV bars on business days ending on end (a Wednesday by default).
+def daily_bars(periods, end="2026-10-14"):
+    index = pd.bdate_range(end=end, periods=periods, name="Date")
+    values = np.arange(1.0, periods + 1)
+    return pd.DataFrame(
+        {
+            "Open": values,
+            "High": values + 0.5,
+            "Low": values - 0.5,
+            "Close": values + 0.25,
+            "Volume": values * 100,
+        },
+        index=index,
+    )
+
+
+# Test the weekly OHLCV aggregation and that weeks carry their last trading day.
+def test_to_weekly():
+    daily = daily_bars(8)  # Mon 2026-10-05 .. Wed 2026-10-14
+    daily = daily.drop(pd.Timestamp("2026-10-09"))  # Friday holiday
+
+    weekly = to_weekly(daily)
+
+    assert weekly.index.name == "Date"
+    # The holiday week ends on Thursday and the unfinished week on the last bar,
+    # not on the (future) Friday 2026-10-16
+    assert weekly.index.strftime("%Y-%m-%d").tolist() == ["2026-10-08", "2026-10-14"]
+    assert weekly.iloc[0].to_dict() == {
+        "Open": 1.0,
+        "High": 4.5,
+        "Low": 0.5,
+        "Close": 4.25,
+        "Volume": 1000.0,
+    }
+    assert weekly.iloc[1].to_dict() == {
+        "Open": 6.0,
+        "High": 8.5,
+        "Low": 5.5,
+        "Close": 8.25,
+        "Volume": 2100.0,
+    }
+
+
+# Test that periods inside the daily window are cut from the cached daily bars.
+def test_get_weekly_bars_trims_daily(monkeypatch):
+    calls = []
+    daily = daily_bars(520)  # two years of business days
+
+    def get_history(ticker, period=None, interval="1d"):
+        calls.append((period, interval))
+        return daily.copy()
+
+    monkeypatch.setattr(stock_data, "get_history", get_history)
+
+    weekly = get_weekly_bars("TEST", "6mo")
+
+    assert calls == [("2y", "1d")]
+    assert weekly.index[0] > pd.Timestamp("2026-04-14")
+    assert weekly.index[0] < pd.Timestamp("2026-04-24")  # within the first week
+    assert weekly.index[-1] == pd.Timestamp("2026-10-14")
+    assert weekly["Volume"].sum() == daily.loc["2026-04-15":, "Volume"].sum()
+
+
+# Test that periods longer than, or not expressible within, 2y fetch 1wk bars.
+@pytest.mark.parametrize("period", ["3y", "ytd", "max"])
+def test_get_weekly_bars_falls_back_to_weekly_download(monkeypatch, period):
+    calls = []
+
+    def get_history(ticker, period=None, interval="1d"):
+        calls.append((period, interval))
+        return pd.DataFrame()
+
+    monkeypatch.setattr(stock_data, "get_history", get_history)
+
+    get_weekly_bars("TEST", period)
+
+    assert calls == [(period, "1wk")]
+
+
+if __name__ == "__main__":
+    pytest.main(["-v"])